@@ -1,8 +1,15 @@
 import os
 import re
 import difflib
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import zip_longest
 from openpyxl import load_workbook, Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter, range_boundaries
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.styles.cell_style import StyleArray
 try:
     from dotenv import load_dotenv
 except Exception:
@@ -19,6 +26,7 @@ IGNORED_COLUMNS = os.getenv("IGNORED_COLUMNS", "").split(",")
 IGNORED_COLORS = os.getenv("IGNORED_COLORS", "").split(",")
 CELLS_TO_BE_ADDED = os.getenv("CELLS_TO_BE_ADDED", "").split(",")
 IGNORED_RANGES = os.getenv("IGNORED_RANGES", "").split(",")
+WORKERS = os.getenv("WORKERS", "1")
 
 # --- CLI overrides ---
 try:
@@ -30,6 +38,7 @@ try:
     parser.add_argument("--ignored-colors", dest="ignored_colors", default=",".join(IGNORED_COLORS), help="Comma-separated color codes to ignore (e.g., FF00FF00)")
     parser.add_argument("--add-ranges", dest="add_ranges", default=",".join(CELLS_TO_BE_ADDED), help="Comma-separated cell ranges to force-include (e.g., A1:B5,C10:D12)")
     parser.add_argument("--ignore-ranges", dest="ignore_ranges", default=",".join(IGNORED_RANGES), help="Comma-separated cell ranges to ignore (e.g., E1:F10)")
+    parser.add_argument("--workers", dest="workers", default=WORKERS, help="Worker processes for comparing sheets on Linux (default: 1; 0 means one per CPU)")
     args, _ = parser.parse_known_args()
     SAMPLE_FILE = args.sample
     IMR_FILE = args.imr
@@ -37,12 +46,18 @@ try:
     IGNORED_COLORS = [s for s in (args.ignored_colors or "").split(",")]
     CELLS_TO_BE_ADDED = [s for s in (args.add_ranges or "").split(",")]
     IGNORED_RANGES = [s for s in (args.ignore_ranges or "").split(",")]
+    WORKERS = args.workers
 except Exception:
     pass
 
 # Defaults if not provided
 if not OUTPUT_FILE:
     OUTPUT_FILE = "comparison_report.xlsx"
+# 0 means one worker per CPU
+WORKERS = str(WORKERS).strip() or "1"
+if not WORKERS.isdecimal():
+    raise ValueError(f"Workers must be a non-negative integer, got: {WORKERS}")
+WORKERS = int(WORKERS)
 
 # --- Check files exist ---
 if not os.path.exists(SAMPLE_FILE):
@@ -55,138 +70,298 @@ wb_sample = load_workbook(SAMPLE_FILE)
 wb_imr = load_workbook(IMR_FILE)
 
 # Data-only workbooks for formulas (evaluated results)
-wb_sample_data = load_workbook(SAMPLE_FILE, data_only=True)
-wb_imr_data = load_workbook(IMR_FILE, data_only=True)
+# Only values are needed here, so read them in read-only mode and keep a
+# {sheet_name: [[row values]]} snapshot instead of full Cell objects
+def load_sheet_values(path):
+    wb_data = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    values = {}
+    for ws in wb_data.worksheets:
+        # Some writers store a stale <dimension>; read every row instead of trusting it
+        ws.reset_dimensions()
+        values[ws.title] = [list(row) for row in ws.iter_rows(values_only=True)]
+    wb_data.close()
+    return values
+
+sample_values = load_sheet_values(SAMPLE_FILE)
+imr_values = load_sheet_values(IMR_FILE)
 
 
 # --- Helper functions ---
+# Per-sheet snapshots of Cell objects, keyed by id(sheet)
+_SHEET_CELLS = {}
+
+# Snapshot a sheet's cells into a 2D list so lookups avoid repeated ws.cell() calls
+def cache_sheet_cells(sheet, max_row, max_col):
+    cells = [list(row) for row in sheet.iter_rows(min_row=1, max_row=max_row,
+                                                  min_col=1, max_col=max_col)]
+    _SHEET_CELLS[id(sheet)] = cells
+    return cells
+
+# Return the cell at (row, col), using the snapshot when available
+def get_cell(sheet, row, col):
+    cells = _SHEET_CELLS.get(id(sheet))
+    if cells is not None and row <= len(cells) and col <= len(cells[row - 1]):
+        return cells[row - 1][col - 1]
+    return sheet.cell(row=row, column=col)
+
+# Return the normalized fill color at (row, col); colors are cached per fill style,
+# so only the cells actually checked against the ignored colors are looked up
+def get_cell_color(sheet, row, col):
+    return get_fill_color(get_cell(sheet, row, col))
+
+# Pack a (row, col) pair into a single int for cheap set keys
+# Columns fit in 15 bits and rows in 21 (Excel max is 16384 x 1048576)
+def pack_coords(row, col):
+    return (row << 15) | col
+
 def safe_str(value):
-    return str(value) if value is not None else "None"
+    if value is None:
+        return "None"
+    if type(value) is str:
+        return value
+    return str(value)
 
 # Normalize color to a consistent string format
 # Handles RGB, indexed, theme colors, and plain strings
 def normalize_color(color):
+    if type(color) is str:
+        return color if color else "None"
     try:
         if not color:
             return "None"
-        if hasattr(color, "rgb") and color.rgb:
-            return str(color.rgb)
-        if hasattr(color, "indexed") and color.indexed is not None:
-            return f"indexed:{color.indexed}"
-        if hasattr(color, "theme") and color.theme is not None:
-            return f"theme:{color.theme}"
+        rgb = getattr(color, "rgb", None)
+        if rgb:
+            return str(rgb)
+        indexed = getattr(color, "indexed", None)
+        if indexed is not None:
+            return f"indexed:{indexed}"
+        theme = getattr(color, "theme", None)
+        if theme is not None:
+            return f"theme:{theme}"
         return str(color)
     except Exception as e:
         return f"Error:{e}"
 
-# Compare font properties between two font objects
+# Style fingerprints cached per (workbook, style table index)
+# openpyxl keeps each distinct font/alignment/fill/border once per workbook and
+# cells only point into those tables, so each entry is read and formatted once
+# Cells that were never styled have no StyleArray yet, which means all-default ids
+_DEFAULT_STYLE = StyleArray()
+_FONT_PROPS = {}
+_ALIGNMENT_PROPS = {}
+_FILL_COLORS = {}
+_BORDER_STRS = {}
+_HAS_BORDER = {}
+
+# (name, size, bold, italic, underline) of a cell's font
+def get_font_props(cell):
+    key = (id(cell.parent.parent), (cell._style or _DEFAULT_STYLE).fontId)
+    props = _FONT_PROPS.get(key)
+    if props is None:
+        f = cell.font
+        props = (f.name, f.size, f.bold, f.italic, f.underline)
+        _FONT_PROPS[key] = props
+    return props
+
+# (horizontal, vertical) of a cell's alignment, as strings
+def get_alignment_props(cell):
+    key = (id(cell.parent.parent), (cell._style or _DEFAULT_STYLE).alignmentId)
+    props = _ALIGNMENT_PROPS.get(key)
+    if props is None:
+        a = cell.alignment
+        props = (safe_str(a.horizontal), safe_str(a.vertical))
+        _ALIGNMENT_PROPS[key] = props
+    return props
+
+# Normalized start color of a cell's fill
+def get_fill_color(cell):
+    key = (id(cell.parent.parent), (cell._style or _DEFAULT_STYLE).fillId)
+    color = _FILL_COLORS.get(key)
+    if color is None:
+        color = normalize_color(cell.fill.start_color)
+        _FILL_COLORS[key] = color
+    return color
+
+# String form of a cell's border
+def get_border_str(cell):
+    key = (id(cell.parent.parent), (cell._style or _DEFAULT_STYLE).borderId)
+    border_str = _BORDER_STRS.get(key)
+    if border_str is None:
+        border_str = str(cell.border)
+        _BORDER_STRS[key] = border_str
+    return border_str
+
+# Compare font properties between two cells
 # Returns a list of issues if there are mismatches
-def compare_fonts(f1, f2):
+def compare_fonts(c1, c2):
     issues = []
-    if (f1.name != f2.name or f1.bold != f2.bold or f1.italic != f2.italic or
-            f1.underline != f2.underline or f1.size != f2.size):
+    props1 = get_font_props(c1)
+    props2 = get_font_props(c2)
+    if props1 != props2:
         issues.append({
             "type": "Font Mismatch",
-            "sample": f"{safe_str(f1.name)} {safe_str(f1.size)} Bold:{safe_str(f1.bold)} "
-                      f"Italic:{safe_str(f1.italic)} Underline:{safe_str(f1.underline)}",
-                      "generated": f"{safe_str(f2.name)} {safe_str(f2.size)} Bold:{safe_str(f2.bold)} "
-                      f"Italic:{safe_str(f2.italic)} Underline:{safe_str(f2.underline)}"
-                      })
+            "sample": "{} {} Bold:{} Italic:{} Underline:{}".format(*map(safe_str, props1)),
+            "generated": "{} {} Bold:{} Italic:{} Underline:{}".format(*map(safe_str, props2))
+        })
     return issues
 
-# Compare alignment properties between two alignment objects
+# Compare alignment properties between two cells
 # Returns a list of issues if there are mismatches
-def compare_alignment(a1, a2):
+def compare_alignment(c1, c2):
     issues = []
-    if safe_str(a1.horizontal) != safe_str(a2.horizontal) or safe_str(a1.vertical) != safe_str(a2.vertical):
+    h1, v1 = get_alignment_props(c1)
+    h2, v2 = get_alignment_props(c2)
+    if h1 != h2 or v1 != v2:
         issues.append({
             "type": "Alignment Mismatch",
-            "sample": f"H:{safe_str(a1.horizontal)} V:{safe_str(a1.vertical)}",
-            "generated": f"H:{safe_str(a2.horizontal)} V:{safe_str(a2.vertical)}"
+            "sample": f"H:{h1} V:{v1}",
+            "generated": f"H:{h2} V:{v2}"
         })
     return issues
 
-# Compare fill properties between two fill objects
+# Compare fill properties between two cells
 # Returns a list of issues if there are mismatches
-def compare_fill(f1, f2):
+def compare_fill(c1, c2):
     issues = []
-    if normalize_color(f1.start_color) != normalize_color(f2.start_color):
+    color1 = get_fill_color(c1)
+    color2 = get_fill_color(c2)
+    if color1 != color2:
         issues.append({
             "type": "Fill Mismatch",
-            "sample": f"ColorCode: {normalize_color(f1.start_color)}",
-            "generated": f"ColorCode: {normalize_color(f2.start_color)}"
+            "sample": f"ColorCode: {color1}",
+            "generated": f"ColorCode: {color2}"
         })
     return issues
 
-# Compare border properties between two border objects
-def compare_border(b1, b2):
+# Compare border properties between two cells
+def compare_border(c1, c2):
     issues = []
-    if str(b1) != str(b2):
+    border1 = get_border_str(c1)
+    border2 = get_border_str(c2)
+    if border1 != border2:
         issues.append({
             "type": "Border Mismatch",
-            "sample": str(b1),
-            "generated": str(b2)
+            "sample": border1,
+            "generated": border2
         })
     return issues
 
+# Raw bytes of the cell's style ids, covering the font/alignment/fill/border ids
+# the format comparison depends on; one C call instead of four descriptor reads
+def get_style_key(cell):
+    return (cell._style or _DEFAULT_STYLE).tobytes()
+
+# Format issues per (sample style key, IMR style key) pair
+# Most cells share a handful of styles, so each distinct pair is compared once
+_FORMAT_ISSUES = {}
+
 # Compare two cells: format and value
 def compare_cell(cell_sample_format, cell_imr_format, cell_sample_val, cell_imr_val):
     issues = []
-    if safe_str(cell_sample_val) != safe_str(cell_imr_val):
+    sample_str = safe_str(cell_sample_val)
+    imr_str = safe_str(cell_imr_val)
+    if sample_str != imr_str:
         issues.append({
             "type": "Value Mismatch",
-            "sample": safe_str(cell_sample_val),
-            "generated": safe_str(cell_imr_val)
+            "sample": sample_str,
+            "generated": imr_str
         })
-    issues += compare_fonts(cell_sample_format.font, cell_imr_format.font)
-    issues += compare_alignment(cell_sample_format.alignment,
-                                cell_imr_format.alignment)
-    issues += compare_fill(cell_sample_format.fill, cell_imr_format.fill)
-    issues += compare_border(cell_sample_format.border, cell_imr_format.border)
+    style_pair = (get_style_key(cell_sample_format), get_style_key(cell_imr_format))
+    format_issues = _FORMAT_ISSUES.get(style_pair)
+    if format_issues is None:
+        format_issues = (compare_fonts(cell_sample_format, cell_imr_format) +
+                         compare_alignment(cell_sample_format, cell_imr_format) +
+                         compare_fill(cell_sample_format, cell_imr_format) +
+                         compare_border(cell_sample_format, cell_imr_format))
+        _FORMAT_ISSUES[style_pair] = format_issues
+    if format_issues:
+        issues += format_issues
     return issues
 
+# Ignored colors are cleaned up once; a color matches exactly, by RGB suffix
+# for FF-prefixed codes, or as a theme/indexed reference
+if IGNORED_COLORS and IGNORED_COLORS[0]:
+    _IGNORED_COLOR_CODES = [c.strip() for c in IGNORED_COLORS if c.strip()]
+else:
+    _IGNORED_COLOR_CODES = []
+_IGNORED_COLOR_SET = frozenset(_IGNORED_COLOR_CODES)
+_IGNORED_COLOR_SUFFIXES = tuple(c[2:] for c in _IGNORED_COLOR_CODES if c.startswith('FF'))
+_IGNORED_COLOR_REFS = tuple(f"{kind}:{c}" for c in _IGNORED_COLOR_CODES
+                            for kind in ("theme", "indexed"))
+# Match results per normalized color string; sheets only use a handful of colors
+_IGNORED_COLOR_MATCHES = {}
+
+# Check if a normalized color string matches one of the ignored colors
+def is_ignored_color_code(cell_color):
+    matched = _IGNORED_COLOR_MATCHES.get(cell_color)
+    if matched is None:
+        matched = (cell_color in _IGNORED_COLOR_SET or
+                   (bool(_IGNORED_COLOR_SUFFIXES) and cell_color.endswith(_IGNORED_COLOR_SUFFIXES)) or
+                   any(ref in cell_color for ref in _IGNORED_COLOR_REFS))
+        _IGNORED_COLOR_MATCHES[cell_color] = matched
+    return matched
+
 # Check if a cell has an ignored color
-def is_ignored_color(cell):
+def is_ignored_color(sheet, row, col):
     """Check if cell has an ignored color"""
-    if not IGNORED_COLORS or not IGNORED_COLORS[0]:
+    if not _IGNORED_COLOR_CODES:
         return False
+    return is_ignored_color_code(get_cell_color(sheet, row, col))
 
-    cell_color = normalize_color(cell.fill.start_color)
+# Per-sheet {(row, col): (start_row, start_col)} maps of merged top-left cells,
+# keyed by id(sheet)
+_MERGED_TOP_LEFTS = {}
 
-    for ignored_color in IGNORED_COLORS:
-        ignored_color_clean = ignored_color.strip()
-        if ignored_color_clean:
-            if cell_color == ignored_color_clean:
-                return True
-            elif (ignored_color_clean.startswith('FF') and
-                  cell_color.endswith(ignored_color_clean[2:])):
-                return True
-            elif f"theme:{ignored_color_clean}" in cell_color or f"indexed:{ignored_color_clean}" in cell_color:
-                return True
-
-    return False
-
-# Get the merged range for a cell, returns (start_row, start_col, end_row, end_col) or None
-def get_merged_range(sheet, row, col):
-    """Get the merged range for a cell, returns (start_row, start_col, end_row, end_col) or None"""
+# Map every cell covered by a merged range to that range's top-left cell, in one
+# pass; the first range covering a cell wins
+def build_merged_map(sheet):
+    top_lefts = {}
     for merged_range in sheet.merged_cells.ranges:
-        if (merged_range.min_row <= row <= merged_range.max_row and
-                merged_range.min_col <= col <= merged_range.max_col):
-            return (merged_range.min_row, merged_range.min_col,
-                    merged_range.max_row, merged_range.max_col)
-    return None
+        top_left = (merged_range.min_row, merged_range.min_col)
+        for r in range(merged_range.min_row, merged_range.max_row + 1):
+            for c in range(merged_range.min_col, merged_range.max_col + 1):
+                if (r, c) not in top_lefts:
+                    top_lefts[(r, c)] = top_left
+    _MERGED_TOP_LEFTS[id(sheet)] = top_lefts
+    return top_lefts
+
+# Return the sheet's merged top-left map, building it on first use
+def get_merged_map(sheet):
+    top_lefts = _MERGED_TOP_LEFTS.get(id(sheet))
+    if top_lefts is None:
+        top_lefts = build_merged_map(sheet)
+    return top_lefts
 
 # Return the top-left cell coordinates for a given cell (resolving merged ranges)
+# Sheets without merged cells skip the lookup entirely
 def get_top_left_coords(sheet, row, col):
-    merged = get_merged_range(sheet, row, col)
-    if merged:
-        return merged[0], merged[1]
-    return row, col
+    top_lefts = get_merged_map(sheet)
+    if not top_lefts:
+        return row, col
+    coords = (row, col)
+    return top_lefts.get(coords, coords)
+
+# Read a value from a per-sheet snapshot of rows, None outside the snapshot
+def get_value(values, row, col):
+    if row > len(values):
+        return None
+    row_values = values[row - 1]
+    if col > len(row_values):
+        return None
+    return row_values[col - 1]
+
+# Columns (1-based, up to max_col) where either of two snapshots has a value in the row
+def value_columns(values_a, values_b, row, max_col):
+    row_a = values_a[row - 1][:max_col] if row <= len(values_a) else ()
+    row_b = values_b[row - 1][:max_col] if row <= len(values_b) else ()
+    return [c for c, (a, b) in enumerate(zip_longest(row_a, row_b), 1)
+            if a is not None or b is not None]
 
 # Read an effective value by resolving merged cells to their top-left value
-def get_effective_value(ws_data, ws_format, row, col):
+# values is the per-sheet snapshot of rows built from the data-only workbook
+def get_effective_value(values, ws_format, row, col):
     tl_r, tl_c = get_top_left_coords(ws_format, row, col)
-    return ws_data.cell(row=tl_r, column=tl_c).value
+    return get_value(values, tl_r, tl_c)
 
 # Check if a cell is part of an ignored color range (including merged cells)
 def is_cell_in_ignored_range(sheet, row, col):
@@ -194,16 +369,13 @@ def is_cell_in_ignored_range(sheet, row, col):
     if is_cell_in_added_ranges(row, col):
         return False
 
-    cell = sheet.cell(row=row, column=col)
-    if is_ignored_color(cell):
+    if is_ignored_color(sheet, row, col):
         return True
 
-    merged_range = get_merged_range(sheet, row, col)
-    if merged_range:
-        start_row, start_col, end_row, end_col = merged_range
-        top_left_cell = sheet.cell(row=start_row, column=start_col)
-        if is_ignored_color(top_left_cell):
-            return True
+    # Inside a merged range the fill of its top-left cell counts as well
+    start_row, start_col = get_top_left_coords(sheet, row, col)
+    if (start_row != row or start_col != col) and is_ignored_color(sheet, start_row, start_col):
+        return True
 
     return False
 
@@ -226,50 +398,61 @@ def is_cell_ignored(ws_sample, ws_imr, row, col):
 def parse_cell_range(cell_range_str):
     """Parse a cell range string like 'A1:B5' and return (start_row, start_col, end_row, end_col)"""
     try:
-        from openpyxl.utils import range_boundaries
         min_col, min_row, max_col, max_row = range_boundaries(cell_range_str)
         return (min_row, min_col, max_row, max_col)
     except Exception as e:
         print(f"Error parsing cell range '{cell_range_str}': {e}")
         return None
 
-# Check if a cell is in any of the specified cell ranges to be added
-def is_cell_in_added_ranges(row, col):
-    """Check if a cell is in any of the specified cell ranges to be added"""
-    if not CELLS_TO_BE_ADDED or not CELLS_TO_BE_ADDED[0]:
-        return False
-
-    for cell_range_str in CELLS_TO_BE_ADDED:
+# Parse a list of range strings once, skipping blanks and invalid ranges
+def parse_cell_ranges(cell_range_strs):
+    parsed_ranges = []
+    if not cell_range_strs or not cell_range_strs[0]:
+        return parsed_ranges
+    for cell_range_str in cell_range_strs:
         cell_range_str = cell_range_str.strip()
         if not cell_range_str:
             continue
-
         parsed_range = parse_cell_range(cell_range_str)
         if parsed_range:
-            start_row, start_col, end_row, end_col = parsed_range
-            if (start_row <= row <= end_row and start_col <= col <= end_col):
-                return True
+            parsed_ranges.append(parsed_range)
+    return parsed_ranges
 
+# Ranges are parsed once here rather than on every cell check
+_ADDED_RANGES = parse_cell_ranges(CELLS_TO_BE_ADDED)
+_IGNORED_RANGES = parse_cell_ranges(IGNORED_RANGES)
+
+# Check if a cell is in any of the specified cell ranges to be added
+def is_cell_in_added_ranges(row, col):
+    """Check if a cell is in any of the specified cell ranges to be added"""
+    for start_row, start_col, end_row, end_col in _ADDED_RANGES:
+        if start_row <= row <= end_row and start_col <= col <= end_col:
+            return True
     return False
 
 # Check if a cell is in any of the specified cell ranges to be ignored
 def is_cell_in_ignored_ranges(row, col):
     """Check if a cell is in any of the specified cell ranges to be ignored"""
-    if not IGNORED_RANGES or not IGNORED_RANGES[0]:
-        return False
+    for start_row, start_col, end_row, end_col in _IGNORED_RANGES:
+        if start_row <= row <= end_row and start_col <= col <= end_col:
+            return True
+    return False
 
-    for cell_range_str in IGNORED_RANGES:
-        cell_range_str = cell_range_str.strip()
-        if not cell_range_str:
+# Build a flat row-major mask over a max_row x max_col grid marking the cells
+# covered by the given (start_row, start_col, end_row, end_col) ranges
+# Index (r - 1) * max_col + (c - 1); ranges are clipped to the grid
+def build_range_mask(ranges, max_row, max_col):
+    mask = bytearray(max_row * max_col)
+    for start_row, start_col, end_row, end_col in ranges:
+        end_row = min(end_row, max_row)
+        end_col = min(end_col, max_col)
+        if start_row > end_row or start_col > end_col:
             continue
-
-        parsed_range = parse_cell_range(cell_range_str)
-        if parsed_range:
-            start_row, start_col, end_row, end_col = parsed_range
-            if (start_row <= row <= end_row and start_col <= col <= end_col):
-                return True
-
-    return False
+        width = end_col - start_col + 1
+        for r in range(start_row, end_row + 1):
+            k = (r - 1) * max_col + start_col - 1
+            mask[k:k + width] = b"\x01" * width
+    return mask
 
 # Debug function to print cell colors for troubleshooting
 def debug_cell_colors(sheet, max_rows=10, max_cols=10):
@@ -280,45 +463,65 @@ def debug_cell_colors(sheet, max_rows=10, max_cols=10):
     print("Cell colors in first few rows/columns:")
     for r in range(1, min(max_rows + 1, sheet.max_row + 1)):
         for c in range(1, min(max_cols + 1, sheet.max_column + 1)):
-            cell = sheet.cell(row=r, column=c)
-            cell_color = normalize_color(cell.fill.start_color)
+            cell = get_cell(sheet, r, c)
+            cell_color = get_cell_color(sheet, r, c)
             if cell_color != "None":
-                is_ignored = is_ignored_color(cell)
+                is_ignored = is_ignored_color(sheet, r, c)
                 is_added = is_cell_in_added_ranges(r, c)
                 is_ignored_range = is_cell_in_ignored_ranges(r, c)
                 print(
                     f"Cell {cell.coordinate}: color={cell_color}, ignored={is_ignored}, added={is_added}, ignored_range={is_ignored_range}")
 
+# Check if any side of a cell's border is set
+def has_border(cell):
+    key = (id(cell.parent.parent), (cell._style or _DEFAULT_STYLE).borderId)
+    bordered = _HAS_BORDER.get(key)
+    if bordered is None:
+        b = cell.border
+        bordered = bool(b.left.style or b.right.style or b.top.style or b.bottom.style)
+        _HAS_BORDER[key] = bordered
+    return bordered
+
+# Build a bitmap (one bytearray per row) marking the cells that have any border
+def build_border_bitmap(cells):
+    return [bytearray(has_border(cell) for cell in row) for row in cells]
+
+# Grow a table from a bordered seed cell (0-based i, j) over the border bitmaps
+# Marks the table's cells as visited and returns its 0-based (end_row, end_col)
+def grow_table(bord, bord_cols, visited, i, j):
+    max_row = len(bord)
+    max_col = len(bord_cols)
+    end_row = i
+    while end_row + 1 < max_row and bord[end_row + 1].find(1, j) != -1:
+        end_row += 1
+    end_col = j
+    while end_col + 1 < max_col and bord_cols[end_col + 1].find(1, i, end_row + 1) != -1:
+        end_col += 1
+    width = end_col - j + 1
+    for r in range(i, end_row + 1):
+        visited[r][j:end_col + 1] = b"\x01" * width
+    return end_row, end_col
+
 # Find all tables in a sheet based on bordered cells
+# Takes the 2D cell snapshot of the sheet (see cache_sheet_cells)
 # Returns a list of tuples (start_row, start_col, end_row, end_col)
-def find_bordered_tables(sheet):
-    visited = set()
+def find_bordered_tables(cells):
+    bord = build_border_bitmap(cells)
+    max_row = len(bord)
+    max_col = len(bord[0]) if bord else 0
+    # Column-major copy so the column growth test is a single find() as well
+    bord_cols = [bytearray(col) for col in zip(*bord)]
+    visited = [bytearray(max_col) for _ in range(max_row)]
     tables = []
-    max_row = sheet.max_row
-    max_col = sheet.max_column
 
-    def has_border(cell):
-        b = cell.border
-        return any([b.left.style, b.right.style, b.top.style, b.bottom.style])
-
-    for i in range(1, max_row + 1):
-        for j in range(1, max_col + 1):
-            if (i, j) in visited:
-                continue
-            cell = sheet.cell(row=i, column=j)
-            if has_border(cell):
-                end_row = i
-                while end_row + 1 <= max_row and any(has_border(sheet.cell(row=end_row+1, column=k))
-                                                     for k in range(j, max_col+1)):
-                    end_row += 1
-                end_col = j
-                while end_col + 1 <= max_col and any(has_border(sheet.cell(row=k, column=end_col+1))
-                                                     for k in range(i, end_row+1)):
-                    end_col += 1
-                for r in range(i, end_row + 1):
-                    for c in range(j, end_col + 1):
-                        visited.add((r, c))
-                tables.append((i, j, end_row, end_col))
+    for i in range(max_row):
+        # Jump straight to the next bordered cell in the row
+        j = bord[i].find(1)
+        while j != -1:
+            if not visited[i][j]:
+                end_row, end_col = grow_table(bord, bord_cols, visited, i, j)
+                tables.append((i + 1, j + 1, end_row + 1, end_col + 1))
+            j = bord[i].find(1, j + 1)
     return tables
 
 # Merge rectangles that overlap or touch into union rectangles
@@ -348,41 +551,77 @@ def merge_two_rects(a, b):
     )
 
 
+def _find_root(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+# One union-find round over touching rectangles; returns the bounding box of
+# each group, ordered by the group's first input rectangle
+def _merge_touching_once(rects):
+    parent = list(range(len(rects)))
+    order = sorted(range(len(rects)), key=lambda k: (rects[k][0], rects[k][1]))
+    active = []
+    for i in order:
+        current = rects[i]
+        # Drop rectangles that end more than one row above this one
+        active = [j for j in active if rects[j][2] >= current[0] - 1]
+        for j in active:
+            if rectangles_overlap_or_touch(current, rects[j]):
+                root_i = _find_root(parent, i)
+                root_j = _find_root(parent, j)
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+        active.append(i)
+
+    groups = {}
+    for i, rect in enumerate(rects):
+        root = _find_root(parent, i)
+        groups[root] = merge_two_rects(groups[root], rect) if root in groups else rect
+    return list(groups.values())
+
+
 def merge_rectangles(rects):
+    # Merged boxes can reach rectangles their parts did not touch, so repeat
+    # until a round leaves the count unchanged
     rects = rects[:]
-    changed = True
-    while changed and len(rects) > 1:
-        changed = False
-        new_rects = []
-        used = [False] * len(rects)
-        for i in range(len(rects)):
-            if used[i]:
-                continue
-            current = rects[i]
-            for j in range(i + 1, len(rects)):
-                if used[j]:
-                    continue
-                other = rects[j]
-                if rectangles_overlap_or_touch(current, other):
-                    current = merge_two_rects(current, other)
-                    used[j] = True
-                    changed = True
-            new_rects.append(current)
-            used[i] = True
-        rects = new_rects
+    while len(rects) > 1:
+        merged = _merge_touching_once(rects)
+        if len(merged) == len(rects):
+            break
+        rects = merged
     return rects
 
-def header_similarity(text_a, text_b):
-    """Compute similarity between two header strings in [0,1]."""
-    if text_a is None or text_b is None:
+def normalize_header(text):
+    return str(text).strip().lower()
+
+# Build a difflib matcher holding a normalized header as its second sequence, so
+# difflib indexes that header once however many headers it is scored against
+def header_matcher(text):
+    matcher = difflib.SequenceMatcher(None)
+    matcher.set_seq2(normalize_header(text))
+    return matcher
+
+def header_similarity(text_a, matcher_b, min_score=0.0):
+    """
+    Compute similarity in [0,1] between header text_a and the header held by
+    matcher_b (see header_matcher). Scores that cannot exceed min_score, by
+    difflib's cheap upper bounds, are returned as 0.0 without the full ratio.
+    """
+    if text_a is None:
         return 0.0
-    a = str(text_a).strip().lower()
-    b = str(text_b).strip().lower()
+    a = normalize_header(text_a)
+    b = matcher_b.b
     if not a or not b:
         return 0.0
     if a == b:
         return 1.0
-    return difflib.SequenceMatcher(None, a, b).ratio()
+    matcher_b.set_seq1(a)
+    if matcher_b.real_quick_ratio() <= min_score or matcher_b.quick_ratio() <= min_score:
+        return 0.0
+    return matcher_b.ratio()
 
 def pair_columns_order_preserving(header_sample_map, header_imr_map, similarity_threshold=0.72):
     """
@@ -404,179 +643,157 @@ def pair_columns_order_preserving(header_sample_map, header_imr_map, similarity_
         if s_hdr in header_imr_map and s_hdr not in used_imr:
             paired.append((s_hdr, s_hdr))
             used_imr.add(s_hdr)
+    matched_sample = {s for s, _ in paired}
 
     # Second pass: fuzzy matching for remaining
+    # Each IMR header keeps its own matcher; candidates that cannot beat the
+    # current best are rejected by header_similarity() before the full ratio
+    imr_matchers = {i_hdr: header_matcher(i_hdr) for i_hdr in imr_headers
+                    if i_hdr not in used_imr}
     for s_hdr in sample_headers:
-        if any(s_hdr == p[0] for p in paired):
+        if s_hdr in matched_sample:
             continue
         best_hdr = None
         best_score = similarity_threshold
-        for i_hdr in imr_headers:
+        for i_hdr, matcher in imr_matchers.items():
             if i_hdr in used_imr:
                 continue
-            score = header_similarity(s_hdr, i_hdr)
+            score = header_similarity(s_hdr, matcher, best_score)
             if score > best_score:
                 best_score = score
                 best_hdr = i_hdr
         if best_hdr is not None:
             paired.append((s_hdr, best_hdr))
             used_imr.add(best_hdr)
+            matched_sample.add(s_hdr)
 
     # Preserve original left-to-right order based on sample
-    paired.sort(key=lambda x: sample_headers.index(x[0]))
+    sample_order = {s_hdr: k for k, s_hdr in enumerate(sample_headers)}
+    paired.sort(key=lambda x: sample_order[x[0]])
 
-    matched_sample = {s for s, _ in paired}
     matched_imr = {i for _, i in paired}
     missing_in_imr = [s for s in sample_headers if s not in matched_sample]
     missing_in_sample = [i for i in imr_headers if i not in matched_imr]
 
     return paired, missing_in_imr, missing_in_sample
 
-# Add a hyperlink to the summary sheet
-def add_hyperlink(sheet_summary, row, col, target_sheet, display_text=None):
-    cell = sheet_summary.cell(row=row, column=col)
+# Sheet names containing anything but letters/underscores must be quoted in links
+_SHEET_NAME_NEEDS_QUOTES_RE = re.compile(r"[^A-Za-z_]")
+
+# Turn a summary cell into a hyperlink to the target sheet
+def add_hyperlink(cell, target_sheet, display_text=None):
     display_text = display_text or target_sheet
-    if re.search(r"[^A-Za-z_]", target_sheet):
+    if _SHEET_NAME_NEEDS_QUOTES_RE.search(target_sheet):
         safe_sheet_name = f"'{target_sheet}'"
     else:
         safe_sheet_name = target_sheet
     cell.hyperlink = f"#{safe_sheet_name}!A1"
     cell.value = display_text
     # Apply hyperlink formatting: blue color, underline, Aptos Narrow font
-    cell.font = Font(name="Aptos Narrow", size=11,
-                     color="0000FF", underline="single")
+    cell.font = _HYPERLINK_FONT
     # Apply border formatting without overriding font
-    cell.border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    cell.alignment = Alignment(horizontal="left", vertical="top")
+    cell.border = _THIN_BORDER
+    cell.alignment = _DATA_ALIGN
+
+# Shared style objects for the report; openpyxl dedupes styles by value,
+# so assigning the same instances avoids rebuilding them for every cell
+_THIN = Side(style='thin')
+_THIN_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+_HEADER_FONT = Font(name="Aptos Narrow", size=12, bold=True, color="000000")
+_HEADER_FILL = PatternFill(start_color="ADD8E6", end_color="ADD8E6", fill_type="solid")
+_HEADER_ALIGN = Alignment(horizontal="center", vertical="center")
+_DATA_FONT = Font(name="Aptos Narrow", size=11, color="000000")
+_DATA_ALIGN = Alignment(horizontal="left", vertical="top")
+_HYPERLINK_FONT = Font(name="Aptos Narrow", size=11, color="0000FF", underline="single")
 
 # Apply header formatting to a cell
 # Bold, Aptos Narrow font, 12pt size, Light Blue fill, Black text
 # Center aligned, with thin borders
 def apply_header_formatting(cell):
     """Apply header formatting: Bold, Aptos Narrow, 12pt, Light Blue fill, Black text, Center aligned"""
-    cell.font = Font(name="Aptos Narrow", size=12, bold=True, color="000000")
-    cell.fill = PatternFill(start_color="ADD8E6",
-                            end_color="ADD8E6", fill_type="solid")
-    cell.alignment = Alignment(horizontal="center", vertical="center")
-    cell.border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
+    cell.font = _HEADER_FONT
+    cell.fill = _HEADER_FILL
+    cell.alignment = _HEADER_ALIGN
+    cell.border = _THIN_BORDER
 
 # Apply data formatting to a cell
 # Aptos Narrow font, 11pt size, Black text, Top-Left aligned,
 # with thin borders
 def apply_data_formatting(cell):
     """Apply data formatting: Aptos Narrow, 11pt, Black text, Top-Left aligned, All borders"""
-    cell.font = Font(name="Aptos Narrow", size=11, color="000000")
-    cell.alignment = Alignment(horizontal="left", vertical="top")
-    cell.border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-
-
-# --- Main comparison ---
-wb_output = Workbook()
-summary_ws = wb_output.active
-summary_ws.title = "Summary"
-summary_ws.append(["Sheet Name", "Hyperlink",
-                   "Missing Details", "Issue Count", "Ignored Issues Count"])
-
-# Apply header formatting to summary sheet
-for col in range(1, 6):  # 5 columns
-    apply_header_formatting(summary_ws.cell(row=1, column=col))
-row_summary = 2
-
-# Preserve order: sample sheets first, then IMR-only sheets
-ordered_sheetnames = list(wb_sample.sheetnames) + \
-    [s for s in wb_imr.sheetnames if s not in wb_sample.sheetnames]
-
-for sheet_name in ordered_sheetnames:
+    cell.font = _DATA_FONT
+    cell.alignment = _DATA_ALIGN
+    cell.border = _THIN_BORDER
+
+# Build a write-only cell for ws, optionally applying one of the formatting helpers
+def make_cell(ws, value, formatting=None):
+    cell = WriteOnlyCell(ws, value=value)
+    if formatting is not None:
+        formatting(cell)
+    return cell
+
+# Append a row of header cells
+def append_header_row(ws, values):
+    ws.append([make_cell(ws, v, apply_header_formatting) for v in values])
+
+# Append a row of data cells
+def append_data_row(ws, values):
+    ws.append([make_cell(ws, v, apply_data_formatting) for v in values])
+
+# Append a summary row: sheet name, hyperlink to the sheet, details and counts
+def append_summary_row(ws, sheet_name, missing_details, issue_count, ignored_count):
+    link_cell = WriteOnlyCell(ws)
+    add_hyperlink(link_cell, sheet_name)
+    ws.append([
+        make_cell(ws, sheet_name, apply_data_formatting),
+        link_cell,
+        make_cell(ws, missing_details, apply_data_formatting),
+        make_cell(ws, issue_count, apply_data_formatting),
+        make_cell(ws, ignored_count, apply_data_formatting),
+    ])
+
+
+# Compare one sheet present in both workbooks
+# Returns (report_rows, ignored_issues, issues_count, ignored_issues_count), where
+# report_rows holds (formatted, row) pairs in output order
+def compare_sheet(sheet_name):
     issues_count = 0
     ignored_issues_count = 0
 
-    # Handle missing sheets
-    if sheet_name not in wb_sample.sheetnames:
-        summary_ws.cell(row=row_summary, column=1, value=sheet_name)
-        add_hyperlink(summary_ws, row_summary, 2, sheet_name)
-        summary_ws.cell(row=row_summary, column=3, value="Missing In Sample")
-        summary_ws.cell(row=row_summary, column=4, value=0)
-        summary_ws.cell(row=row_summary, column=5, value=0)
-
-        apply_data_formatting(summary_ws.cell(row=row_summary, column=1))
-        apply_data_formatting(summary_ws.cell(row=row_summary, column=3))
-        apply_data_formatting(summary_ws.cell(row=row_summary, column=4))
-        apply_data_formatting(summary_ws.cell(row=row_summary, column=5))
-        row_summary += 1
-        continue
-
-    if sheet_name not in wb_imr.sheetnames:
-        summary_ws.cell(row=row_summary, column=1, value=sheet_name)
-        add_hyperlink(summary_ws, row_summary, 2, sheet_name)
-        summary_ws.cell(row=row_summary, column=3, value="Missing In IMR_Report")
-        summary_ws.cell(row=row_summary, column=4, value=0)
-        summary_ws.cell(row=row_summary, column=5, value=0)
-
-        apply_data_formatting(summary_ws.cell(row=row_summary, column=1))
-        apply_data_formatting(summary_ws.cell(row=row_summary, column=3))
-        apply_data_formatting(summary_ws.cell(row=row_summary, column=4))
-        apply_data_formatting(summary_ws.cell(row=row_summary, column=5))
-        row_summary += 1
-        continue
-
     ws_sample = wb_sample[sheet_name]
     ws_imr = wb_imr[sheet_name]
-    ws_sample_data = wb_sample_data[sheet_name]
-    ws_imr_data = wb_imr_data[sheet_name]
-
-    ws_out = wb_output.create_sheet(title=sheet_name)
-    ws_out.append(["Cell", "Name", "Column Name", "Issue Type",
-                   "Sample Value", "Generated Value"])
+    values_sample = sample_values[sheet_name]
+    values_imr = imr_values[sheet_name]
 
-    for col in range(1, 7):  # 6 columns
-        apply_header_formatting(ws_out.cell(row=1, column=col))
+    # Snapshot both sheets' cells over the union of their used areas; every
+    # coordinate visited below lies inside it, so the grids are indexed directly
+    max_row_union = max(ws_sample.max_row, ws_imr.max_row)
+    max_col_union = max(ws_sample.max_column, ws_imr.max_column)
+    cells_sample = cache_sheet_cells(ws_sample, max_row_union, max_col_union)
+    cells_imr = cache_sheet_cells(ws_imr, max_row_union, max_col_union)
+    # Column letters for the report's cell references, indexed by 1-based column
+    col_letters = [""] + [get_column_letter(c) for c in range(1, max_col_union + 1)]
 
+    report_rows = []
     ignored_issues = []
     seen_pairs = set()
 
-    def is_top_left_position(r, c):
-        s_r, s_c = get_top_left_coords(ws_sample, r, c)
-        i_r, i_c = get_top_left_coords(ws_imr, r, c)
-        return (r == s_r and c == s_c) or (r == i_r and c == i_c)
-
-    def canonical_pair_for(r, c):
-        s_r, s_c = get_top_left_coords(ws_sample, r, c)
-        i_r, i_c = get_top_left_coords(ws_imr, r, c)
-        return (s_r, s_c, i_r, i_c)
-
     # --- Table comparison (UNION from both sheets) ---
-    tables_sample = find_bordered_tables(ws_sample)
-    tables_imr = find_bordered_tables(ws_imr)
+    tables_sample = find_bordered_tables(cells_sample)
+    tables_imr = find_bordered_tables(cells_imr)
     union_tables = merge_rectangles(tables_sample + tables_imr)
 
-    union_table_cells = set()
-    for (start_row, start_col, end_row, end_col) in union_tables:
-        for r in range(start_row, end_row + 1):
-            for c in range(start_col, end_col + 1):
-                union_table_cells.add((r, c))
+    # Flat row-major masks over the union grid: index (r - 1) * max_col_union + (c - 1)
+    table_mask = build_range_mask(union_tables, max_row_union, max_col_union)
+    ignored_range_mask = build_range_mask(_IGNORED_RANGES, max_row_union, max_col_union)
 
     for (start_row, start_col, end_row, end_col) in union_tables:
         # Build header maps from header row (exclude the first column which is usually row labels)
         header_sample_map = {}
         header_imr_map = {}
         for c in range(start_col + 1, end_col + 1):
-            hs = get_effective_value(ws_sample_data, ws_sample, start_row, c)
-            hi = get_effective_value(ws_imr_data, ws_imr, start_row, c)
+            hs = get_effective_value(values_sample, ws_sample, start_row, c)
+            hi = get_effective_value(values_imr, ws_imr, start_row, c)
             if isinstance(hs, str):
                 hs = hs.strip()
             if isinstance(hi, str):
@@ -594,83 +811,80 @@ for sheet_name in ordered_sheetnames:
             if s_hdr != i_hdr:
                 c_s = header_sample_map[s_hdr]
                 issue_data = [
-                    ws_sample.cell(row=start_row, column=c_s).coordinate,
+                    f"{col_letters[c_s]}{start_row}",
                     "Header",
                     s_hdr,
                     "Value Mismatch",
                     s_hdr,
                     i_hdr
                 ]
-                ws_out.append(issue_data)
+                report_rows.append((False, issue_data))
                 issues_count += 1
 
         # Report true missing columns
         for s_hdr in missing_in_imr:
             c_s = header_sample_map[s_hdr]
             issue_data = [
-                ws_sample.cell(row=start_row, column=c_s).coordinate,
+                f"{col_letters[c_s]}{start_row}",
                 "",
                 s_hdr,
                 "Missing in report",
                 s_hdr,
                 ""
             ]
-            ws_out.append(issue_data)
+            report_rows.append((False, issue_data))
             issues_count += 1
 
         for i_hdr in missing_in_sample:
             c_i = header_imr_map[i_hdr]
             issue_data = [
-                ws_imr.cell(row=start_row, column=c_i).coordinate,
+                f"{col_letters[c_i]}{start_row}",
                 "",
                 i_hdr,
                 "Missing in sample",
                 "",
                 i_hdr
             ]
-            ws_out.append(issue_data)
+            report_rows.append((False, issue_data))
             issues_count += 1
 
         # Now compare data for paired columns row-by-row using the mapped indices
-        seen_row_pairs = set()
+        # Each header and column appears in at most one pair, so every
+        # (row, sample_col, imr_col) is visited exactly once
         for r in range(start_row + 1, end_row + 1):
             # Row header: prefer sample value else IMR
-            row_header = get_effective_value(ws_sample_data, ws_sample, r, start_col)
+            row_header = get_effective_value(values_sample, ws_sample, r, start_col)
             if row_header is None:
-                row_header = get_effective_value(ws_imr_data, ws_imr, r, start_col)
+                row_header = get_effective_value(values_imr, ws_imr, r, start_col)
+            row_offset = (r - 1) * max_col_union - 1
 
             for s_hdr, i_hdr in paired_cols:
                 c_s = header_sample_map[s_hdr]
                 c_i = header_imr_map[i_hdr]
 
-                if is_cell_in_ignored_ranges(r, c_s) and is_cell_in_ignored_ranges(r, c_i):
+                if ignored_range_mask[row_offset + c_s] and ignored_range_mask[row_offset + c_i]:
                     continue
 
-                # Only evaluate once per (row, sample_col, imr_col)
-                pair_key = (r, c_s, c_i)
-                if pair_key in seen_row_pairs:
-                    continue
-                seen_row_pairs.add(pair_key)
-
                 # Effective values and formats (respect merged)
-                val_sample = get_effective_value(ws_sample_data, ws_sample, r, c_s)
-                val_imr = get_effective_value(ws_imr_data, ws_imr, r, c_i)
-
                 s_r, s_c = get_top_left_coords(ws_sample, r, c_s)
                 i_r, i_c = get_top_left_coords(ws_imr, r, c_i)
-                cell_sample_fmt = ws_sample.cell(row=s_r, column=s_c)
-                cell_imr_fmt = ws_imr.cell(row=i_r, column=i_c)
+                val_sample = get_value(values_sample, s_r, s_c)
+                val_imr = get_value(values_imr, i_r, i_c)
+                cell_sample_fmt = cells_sample[s_r - 1][s_c - 1]
+                cell_imr_fmt = cells_imr[i_r - 1][i_c - 1]
+
+                issues = compare_cell(cell_sample_fmt, cell_imr_fmt, val_sample, val_imr)
+                if not issues:
+                    continue
 
                 # Consider ignored if either side is ignored
                 is_ignored = (
                     is_cell_ignored(ws_sample, ws_imr, r, c_s) or
                     is_cell_ignored(ws_sample, ws_imr, r, c_i)
                 )
-
-                issues = compare_cell(cell_sample_fmt, cell_imr_fmt, val_sample, val_imr)
                 for issue in issues:
                     issue_data = [
-                        ws_sample.cell(row=r, column=c_s).coordinate,
+                        f"{col_letters[c_s]}{r}",
                         row_header,
                         s_hdr,
                         issue["type"],
@@ -682,54 +896,58 @@ for sheet_name in ordered_sheetnames:
                         ignored_issues.append(issue_data)
                         ignored_issues_count += 1
                     else:
-                        current_row = ws_out.max_row + 1
-                        ws_out.append(issue_data)
-                        for col in range(1, 7):
-                            apply_data_formatting(ws_out.cell(row=current_row, column=col))
+                        report_rows.append((True, issue_data))
                         issues_count += 1
 
-    # --- Non-table key–value comparison (symmetric across both sheets) ---
-    processed_cells = set()
-    max_row_union = max(ws_sample.max_row, ws_imr.max_row)
-    max_col_union = max(ws_sample.max_column, ws_imr.max_column)
-
-    # Fallback: also sweep the full grid for raw cell-by-cell differences outside tables
-    # to catch values in far columns like AAA that are not captured as key-value pairs
+    # --- Non-table comparison (single sweep across both sheets) ---
+    # Every non-table cell with a value on either side is compared once per merged
+    # region; this also covers the values next to key labels
+    # In rows without merged cells only the columns holding a value on either side
+    # can produce issues, so the sweep visits just those
+    merged_rows = ({r for r, _ in get_merged_map(ws_sample)} |
+                   {r for r, _ in get_merged_map(ws_imr)})
+    all_columns = range(1, max_col_union + 1)
     for r in range(1, max_row_union + 1):
-        for c in range(1, max_col_union + 1):
-            if (r, c) in union_table_cells:
-                continue
-            if is_cell_in_ignored_ranges(r, c):
+        if r in merged_rows:
+            columns = all_columns
+        else:
+            columns = value_columns(values_sample, values_imr, r, max_col_union)
+        row_offset = (r - 1) * max_col_union - 1
+        for c in columns:
+            if table_mask[row_offset + c] or ignored_range_mask[row_offset + c]:
                 continue
-            # Skip cells that will be handled by key-value scanning; only take isolated values
-            left_val_s = get_effective_value(ws_sample_data, ws_sample, r, c - 1) if c > 1 else None
-            left_val_i = get_effective_value(ws_imr_data, ws_imr, r, c - 1) if c > 1 else None
-            this_val_s = get_effective_value(ws_sample_data, ws_sample, r, c)
-            this_val_i = get_effective_value(ws_imr_data, ws_imr, r, c)
+            s_r, s_c = get_top_left_coords(ws_sample, r, c)
+            i_r, i_c = get_top_left_coords(ws_imr, r, c)
+            this_val_s = get_value(values_sample, s_r, s_c)
+            this_val_i = get_value(values_imr, i_r, i_c)
 
             # Only consider if at least one side has a value
             if this_val_s is None and this_val_i is None:
                 continue
 
-            # De-dup merged regions
-            pair_key = canonical_pair_for(r, c)
-            if pair_key in seen_pairs:
-                continue
-            if not is_top_left_position(r, c):
-                continue
-            seen_pairs.add(pair_key)
-
-            s_r, s_c = get_top_left_coords(ws_sample, r, c)
-            i_r, i_c = get_top_left_coords(ws_imr, r, c)
-            cell_sample_fmt = ws_sample.cell(row=s_r, column=s_c)
-            cell_imr_fmt = ws_imr.cell(row=i_r, column=i_c)
+            # De-dup merged regions: only the top-left cell (in either sheet) of
+            # each (sample range, IMR range) pair is compared
+            # A pair whose top-lefts are both this cell can only come up here, so
+            # cells outside merged ranges skip the set entirely
+            if s_r != r or s_c != c or i_r != r or i_c != c:
+                pair_key = (pack_coords(s_r, s_c) << 36) | pack_coords(i_r, i_c)
+                if pair_key in seen_pairs:
+                    continue
+                if not ((r == s_r and c == s_c) or (r == i_r and c == i_c)):
+                    continue
+                seen_pairs.add(pair_key)
 
-            is_ignored = is_cell_ignored(ws_sample, ws_imr, r, c)
+            cell_sample_fmt = cells_sample[s_r - 1][s_c - 1]
+            cell_imr_fmt = cells_imr[i_r - 1][i_c - 1]
 
             issues = compare_cell(cell_sample_fmt, cell_imr_fmt, this_val_s, this_val_i)
+            if not issues:
+                continue
+
+            is_ignored = is_cell_ignored(ws_sample, ws_imr, r, c)
             for issue in issues:
                 issue_data = [
-                    ws_sample.cell(row=r, column=c).coordinate,
+                    f"{col_letters[c]}{r}",
                     "",
                     "",
                     issue["type"],
@@ -740,140 +958,74 @@ for sheet_name in ordered_sheetnames:
                     ignored_issues.append(issue_data)
                     ignored_issues_count += 1
                 else:
-                    current_row = ws_out.max_row + 1
-                    ws_out.append(issue_data)
-                    for col in range(1, 7):
-                        apply_data_formatting(ws_out.cell(row=current_row, column=col))
+                    report_rows.append((True, issue_data))
                     issues_count += 1
 
-    def looks_like_key(text):
-        if not text or not isinstance(text, str):
-            return False
-        stripped = text.strip()
-        if not stripped:
-            return False
-        if stripped.isdigit():
-            return False
-        if stripped.startswith('('):
-            return False
-        return len(stripped) > 1
-
-    # Scan twice: once using sample keys, once using IMR keys
-    for source in ("sample", "imr"):
-        src_ws = ws_sample if source == "sample" else ws_imr
-        src_data = ws_sample_data if source == "sample" else ws_imr_data
-        other_ws = ws_imr if source == "sample" else ws_sample
-        other_data = ws_imr_data if source == "sample" else ws_sample_data
-
-        for r in range(1, max_row_union + 1):
-            for c in range(1, max_col_union + 1):
-                if (r, c) in union_table_cells or (r, c) in processed_cells:
-                    continue
+    return report_rows, ignored_issues, issues_count, ignored_issues_count
 
-                key_text = get_effective_value(src_data, src_ws, r, c)
-                if not looks_like_key(key_text):
-                    continue
+# Compare the given sheets, in worker processes when more than one is requested
+# Workers are forked so they share the already loaded workbooks and snapshots;
+# fork is only safe on Linux (macOS children can crash), so elsewhere, or with a
+# single worker, sheets run in turn
+def compare_sheets(sheet_names):
+    workers = min(WORKERS or os.cpu_count() or 1, len(sheet_names))
+    if workers > 1 and sys.platform.startswith("linux"):
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context("fork")) as executor:
+            return dict(zip(sheet_names, executor.map(compare_sheet, sheet_names)))
+    return {sheet_name: compare_sheet(sheet_name) for sheet_name in sheet_names}
 
-                # Look for the corresponding value in the next columns on the same row
-                for cc in range(c + 1, max_col_union + 1):
-                    if (r, cc) in union_table_cells:
-                        break
-
-                    if is_cell_in_ignored_ranges(r, cc):
-                        continue
-
-                    # Skip if cc is also a key-like cell to avoid chaining keys
-                    if looks_like_key(get_effective_value(src_data, src_ws, r, cc)):
-                        break
-
-                    value_src = get_effective_value(src_data, src_ws, r, cc)
-                    value_other = get_effective_value(other_data, other_ws, r, cc)
-
-                    # De-dup against merged canonical pair
-                    pair_key = canonical_pair_for(r, cc)
-                    if pair_key in seen_pairs:
-                        continue
-                    if not is_top_left_position(r, cc):
-                        continue
-                    seen_pairs.add(pair_key)
-
-                    # Only consider positions where there is some content (in either)
-                    if value_src is None and value_other is None:
-                        continue
-
-                    # Effective formats
-                    s_r, s_c = get_top_left_coords(ws_sample, r, cc)
-                    i_r, i_c = get_top_left_coords(ws_imr, r, cc)
-                    cell_sample_fmt = ws_sample.cell(row=s_r, column=s_c)
-                    cell_imr_fmt = ws_imr.cell(row=i_r, column=i_c)
-
-                    is_ignored = is_cell_ignored(ws_sample, ws_imr, r, cc)
-
-                    # Map values into sample/imr order expected by compare_cell
-                    if source == "sample":
-                        val_sample = value_src
-                        val_imr = value_other
-                    else:
-                        val_sample = value_other
-                        val_imr = value_src
-
-                    issues = compare_cell(cell_sample_fmt, cell_imr_fmt, val_sample, val_imr)
-                    for issue in issues:
-                        issue_data = [
-                            src_ws.cell(row=r, column=cc).coordinate,
-                            key_text,
-                            safe_str(value_src) if source == "sample" else safe_str(value_other),
-                            issue["type"],
-                            issue["sample"],
-                            issue["generated"]
-                        ]
-
-                        if is_ignored:
-                            ignored_issues.append(issue_data)
-                            ignored_issues_count += 1
-                        else:
-                            current_row = ws_out.max_row + 1
-                            ws_out.append(issue_data)
-                            for col in range(1, 7):
-                                apply_data_formatting(ws_out.cell(row=current_row, column=col))
-                            issues_count += 1
-
-                    processed_cells.add((r, cc))
-                    break
-
-                processed_cells.add((r, c))
+# --- Main comparison ---
+# The report is streamed through a write-only workbook: rows are appended once,
+# already formatted, and never revisited
+# It starts with no default sheet, so every compared sheet keeps its report tab,
+# including an input sheet named "Sheet" with no issues (its Summary link works)
+wb_output = Workbook(write_only=True)
+summary_ws = wb_output.create_sheet(title="Summary")
+
+append_header_row(summary_ws, ["Sheet Name", "Hyperlink",
+                               "Missing Details", "Issue Count", "Ignored Issues Count"])
+
+# Preserve order: sample sheets first, then IMR-only sheets
+ordered_sheetnames = list(wb_sample.sheetnames) + \
+    [s for s in wb_imr.sheetnames if s not in wb_sample.sheetnames]
+
+comparable_sheetnames = [s for s in ordered_sheetnames
+                         if s in wb_sample.sheetnames and s in wb_imr.sheetnames]
+sheet_results = compare_sheets(comparable_sheetnames)
+
+for sheet_name in ordered_sheetnames:
+    # Handle missing sheets
+    if sheet_name not in wb_sample.sheetnames:
+        append_summary_row(summary_ws, sheet_name, "Missing In Sample", 0, 0)
+        continue
+
+    if sheet_name not in wb_imr.sheetnames:
+        append_summary_row(summary_ws, sheet_name, "Missing In IMR_Report", 0, 0)
+        continue
+
+    report_rows, ignored_issues, issues_count, ignored_issues_count = sheet_results[sheet_name]
+
+    ws_out = wb_output.create_sheet(title=sheet_name)
+    append_header_row(ws_out, ["Cell", "Name", "Column Name", "Issue Type",
+                               "Sample Value", "Generated Value"])
+    for formatted, issue_data in report_rows:
+        if formatted:
+            append_data_row(ws_out, issue_data)
+        else:
+            ws_out.append(issue_data)
 
     # --- Add Ignored Columns Section ---
     if ignored_issues:
         ws_out.append([])
-        ws_out.append(["***Columns To Be Ignored***"])
-        apply_header_formatting(ws_out.cell(row=ws_out.max_row, column=1))
-        ws_out.append(["Cell", "Name", "Column Name", "Issue Type",
-                       "Sample Value", "Generated Value"])
-        for col in range(1, 7):
-            apply_header_formatting(ws_out.cell(row=ws_out.max_row, column=col))
+        append_header_row(ws_out, ["***Columns To Be Ignored***"])
+        append_header_row(ws_out, ["Cell", "Name", "Column Name", "Issue Type",
+                                   "Sample Value", "Generated Value"])
         for issue_data in ignored_issues:
-            current_row = ws_out.max_row + 1
-            ws_out.append(issue_data)
-            for col in range(1, 7):
-                apply_data_formatting(ws_out.cell(row=current_row, column=col))
+            append_data_row(ws_out, issue_data)
 
     # --- Summary ---
-    summary_ws.cell(row=row_summary, column=1, value=sheet_name)
-    add_hyperlink(summary_ws, row_summary, 2, sheet_name)
-    summary_ws.cell(row=row_summary, column=3, value="")
-    summary_ws.cell(row=row_summary, column=4, value=issues_count)
-    summary_ws.cell(row=row_summary, column=5, value=ignored_issues_count)
-
-    apply_data_formatting(summary_ws.cell(row=row_summary, column=1))
-    apply_data_formatting(summary_ws.cell(row=row_summary, column=3))
-    apply_data_formatting(summary_ws.cell(row=row_summary, column=4))
-    apply_data_formatting(summary_ws.cell(row=row_summary, column=5))
-    row_summary += 1
-
-# Remove default sheet if empty
-if "Sheet" in wb_output.sheetnames and wb_output["Sheet"].max_row == 1:
-    del wb_output["Sheet"]
+    append_summary_row(summary_ws, sheet_name, "", issues_count, ignored_issues_count)
 
 # --- Save output ---
 wb_output.save(OUTPUT_FILE)